@@ -1,6 +1,185 @@
+import os
+import sys
+
 import scrapy
-import json
-from typing import Dict, Any, List
+import orjson
+from collections import deque
+from functools import lru_cache
+from typing import Dict, Any, List, Optional
+
+# `scrapy runspider` imports this file as a top-level module, so put the repo root on the
+# path for the `scrapers.pipelines` item pipeline to resolve without PYTHONPATH
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+# Selection set shared by the single-category and batched product queries.
+# Only the fields the dashboard consumes; heavy fields live in DETAIL_QUERY.
+PRODUCTS_FRAGMENT = """
+fragment ProductsFields on Products {
+    total_count
+    page_info {
+        current_page
+        total_pages
+    }
+    items {
+        sku
+        name
+        stock_status
+        url_key
+        price_range {
+            maximum_price {
+                final_price {
+                    value
+                }
+                regular_price {
+                    value
+                }
+            }
+        }
+        small_image {
+            url
+        }
+    }
+}
+"""
+
+CATEGORY_QUERY = """
+query categoryList {
+    categoryList {
+        id
+        uid
+        name
+        url_path
+        children {
+            id
+            uid
+            name
+            url_path
+            children {
+                id
+                uid
+                name
+                url_path
+                children {
+                    id
+                    uid
+                    name
+                    url_path
+                }
+            }
+        }
+    }
+}
+"""
+
+# The category tree request never changes, so serialize it once
+CATEGORY_BODY = orjson.dumps({"query": CATEGORY_QUERY, "variables": {}})
+
+PRODUCTS_QUERY = """
+query getProducts($uid: String!, $page: Int!, $pageSize: Int!) {
+    products(
+        filter: { category_uid: { eq: $uid } }
+        pageSize: $pageSize
+        currentPage: $page
+    ) {
+        ...ProductsFields
+    }
+}
+""" + PRODUCTS_FRAGMENT
+
+# On-demand lookup of the heavy per-product fields for selected SKUs
+DETAIL_QUERY = """
+query getProductDetails($skus: [String]!, $pageSize: Int!) {
+    products(filter: { sku: { in: $skus } }, pageSize: $pageSize) {
+        items {
+            sku
+            price_range {
+                maximum_price {
+                    final_price {
+                        currency
+                    }
+                    discount {
+                        amount_off
+                        percent_off
+                    }
+                }
+            }
+            description {
+                html
+            }
+        }
+    }
+}
+"""
+
+# SKUs looked up per detail request; each request asks for exactly that many products
+DETAIL_BATCH_SIZE = 100
+
+# Largest page Magento serves by default; halved on the fly if the server rejects it
+PAGE_SIZE = 200
+MIN_PAGE_SIZE = 20
+
+def is_page_size_error(errors: List[Dict[str, Any]]) -> bool:
+    """
+    Whether a GraphQL error list complains about the requested page size.
+    """
+    return any("pagesize" in str(error.get("message", "")).lower().replace(" ", "") for error in errors)
+
+def tag_new_product(item: Dict[str, Any], seen_skus: set) -> Optional[Dict[str, Any]]:
+    """
+    Tag a raw GraphQL product with its source site, or return None for a SKU already in `seen_skus`.
+    Shared by the Scrapy spider and the aiohttp crawler.
+    """
+    sku = item.get("sku")
+    if sku in seen_skus:
+        return None
+    seen_skus.add(sku)
+
+    item["source_site"] = "electric-house"
+    return item
+
+def leaf_category_uids(categories: List[Dict[str, Any]]):
+    """
+    Breadth-first walk over the category tree yielding each leaf UID once,
+    even when a leaf is shared by several parents.
+    """
+    queue = deque(categories)
+    seen = set()
+    while queue:
+        cat = queue.popleft()
+        children = cat.get("children") or []
+        if children:
+            queue.extend(children)
+        else:
+            # Leaf category (or one we want to scrape)
+            uid = cat.get("uid")
+            if uid and uid not in seen:
+                seen.add(uid)
+                yield uid
+
+@lru_cache(maxsize=None)
+def build_batched_query(count: int) -> str:
+    """
+    Build one GraphQL query fetching page `$page` for `count` categories.
+    Category i gets the alias `c<i>` bound to the variable `$u<i>`.
+    """
+    params = ", ".join(f"$u{i}: String!" for i in range(count))
+    selections = "".join(
+        f"""
+    c{i}: products(
+        filter: {{ category_uid: {{ eq: $u{i} }} }}
+        pageSize: $pageSize
+        currentPage: $page
+    ) {{
+        ...ProductsFields
+    }}"""
+        for i in range(count)
+    )
+    return f"""
+query getProductsBatch($page: Int!, $pageSize: Int!, {params}) {{{selections}
+}}
+""" + PRODUCTS_FRAGMENT
 
 class ElectricHouseSpider(scrapy.Spider):
     name = "electrichouse"
@@ -17,52 +196,48 @@ class ElectricHouseSpider(scrapy.Spider):
         "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
     }
 
-    def __init__(self, store="en", *args, **kwargs):
+    # Every request hits the same GraphQL endpoint, so multiplex them over one HTTP/2 session
+    custom_settings = {
+        "CONCURRENT_REQUESTS": 64,
+        "CONCURRENT_REQUESTS_PER_DOMAIN": 32,
+        "TWISTED_REACTOR": "twisted.internet.asyncioreactor.AsyncioSelectorReactor",
+        "DOWNLOAD_HANDLERS": {
+            "https": "scrapy.core.downloader.handlers.http2.H2DownloadHandler",
+        },
+        # Stream items straight to Parquet for the dashboard
+        "ITEM_PIPELINES": {
+            "scrapers.pipelines.ArrowPipeline": 300,
+        },
+    }
+
+    # Number of categories whose first page is requested in a single aliased GraphQL query
+    category_batch_size = 12
+
+    def __init__(self, store="en", skus=None, *args, **kwargs):
         super(ElectricHouseSpider, self).__init__(*args, **kwargs)
         self.store_code = store
         self.headers["Store"] = self.store_code
+        # Comma-separated SKUs (`-a skus=A,B`) switch the spider to detail mode
+        self.detail_skus = [sku.strip() for sku in skus.split(",") if sku.strip()] if skus else []
+        # Requests use dont_filter=True (same endpoint URL), so dedupe at the application level:
+        # products listed under several categories, and (category, page, size) fetches
+        self._seen_skus = set()
+        self._seen_pages = set()
 
     def start_requests(self):
         """
         Start by fetching the category tree to get all Category UIDs.
+        In detail mode, fetch descriptions and discounts for the requested SKUs instead.
         """
-        query = """
-        query categoryList {
-            categoryList {
-                id
-                uid
-                name
-                url_path
-                children {
-                    id
-                    uid
-                    name
-                    url_path
-                    children {
-                        id
-                        uid
-                        name
-                        url_path
-                        children {
-                            id
-                            uid
-                            name
-                            url_path
-                        }
-                    }
-                }
-            }
-        }
-        """
-        payload = {
-            "query": query,
-            "variables": {}
-        }
+        if self.detail_skus:
+            yield from self.fetch_product_details(self.detail_skus)
+            return
+
         yield scrapy.Request(
             url=self.api_url,
             method="POST",
             headers=self.headers,
-            body=json.dumps(payload),
+            body=CATEGORY_BODY,
             callback=self.parse_categories,
             errback=self.handle_error
         )
@@ -72,153 +247,191 @@ class ElectricHouseSpider(scrapy.Spider):
         Parse the category tree and yield requests for products in leaf categories.
         """
         try:
-            data = json.loads(response.body)
+            data = orjson.loads(response.body)
             categories = data.get("data", {}).get("categoryList", [])
             self.logger.info(f"Found {len(categories)} root categories")
             
-            # Helper to recursively traverse categories
-            def traverse_categories(cats: List[Dict[str, Any]]):
-                for cat in cats:
-                    # If it has children, traverse them
-                    if cat.get("children") and len(cat["children"]) > 0:
-                        yield from traverse_categories(cat["children"])
-                    else:
-                        # Leaf category (or one we want to scrape)
-                        # Yield a request to fetch products for this category
-                        uid = cat.get("uid")
-                        if uid:
-                            yield from self.fetch_products(uid, page=1)
-
-            yield from traverse_categories(categories)
-
-        except json.JSONDecodeError:
+            # Request the first page of several leaf categories per query
+            leaf_uids = list(leaf_category_uids(categories))
+            for i in range(0, len(leaf_uids), self.category_batch_size):
+                yield from self.fetch_products_batch(leaf_uids[i:i + self.category_batch_size])
+
+        except orjson.JSONDecodeError:
             self.logger.error(f"Failed to decode JSON from {response.url}")
 
-    def fetch_products(self, category_uid: str, page: int):
+    def fetch_products(self, category_uid: str, page: int, page_size: int = PAGE_SIZE):
         """
         Generate a GraphQL request to fetch products for a specific category and page.
         """
-        query = """
-        query getProducts($uid: String!, $page: Int!) {
-            products(
-                filter: { category_uid: { eq: $uid } }
-                pageSize: 20
-                currentPage: $page
-            ) {
-                total_count
-                page_info {
-                    current_page
-                    total_pages
-                }
-                items {
-                    id
-                    uid
-                    sku
-                    name
-                    stock_status
-                    url_key
-                    price_range {
-                        maximum_price {
-                            final_price {
-                                value
-                                currency
-                            }
-                            regular_price {
-                                value
-                                currency
-                            }
-                            discount {
-                                amount_off
-                                percent_off
-                            }
-                        }
-                    }
-                    small_image {
-                        url
-                    }
-                    description {
-                        html
-                    }
-                }
-            }
-        }
-        """
+        key = (category_uid, page, page_size)
+        if key in self._seen_pages:
+            return
+        self._seen_pages.add(key)
+
         payload = {
-            "query": query,
+            "query": PRODUCTS_QUERY,
             "variables": {
                 "uid": category_uid,
-                "page": page
+                "page": page,
+                "pageSize": page_size
             }
         }
-        
+
         yield scrapy.Request(
             url=self.api_url,
             method="POST",
             headers=self.headers,
-            body=json.dumps(payload),
+            body=orjson.dumps(payload),
             callback=self.parse_products,
-            cb_kwargs={"category_uid": category_uid, "page": page},
+            cb_kwargs={"category_uid": category_uid, "page": page, "page_size": page_size},
             meta={"handle_httpstatus_list": [400, 404, 500]}, # Handle errors gracefully
             dont_filter=True # Allow multiple requests to same URL (API endpoint)
         )
 
-    def parse_products(self, response, category_uid: str, page: int):
+    def fetch_products_batch(self, category_uids: List[str], page: int = 1, page_size: int = PAGE_SIZE):
+        """
+        Generate a single GraphQL request for the same page of several categories.
+        """
+        variables: Dict[str, Any] = {"page": page, "pageSize": page_size}
+        variables.update({f"u{i}": uid for i, uid in enumerate(category_uids)})
+        payload = {
+            "query": build_batched_query(len(category_uids)),
+            "variables": variables
+        }
+
+        yield scrapy.Request(
+            url=self.api_url,
+            method="POST",
+            headers=self.headers,
+            body=orjson.dumps(payload),
+            callback=self.parse_products_batch,
+            cb_kwargs={"category_uids": category_uids, "page": page, "page_size": page_size},
+            meta={"handle_httpstatus_list": [400, 404, 500]},
+            dont_filter=True
+        )
+
+    def parse_products_batch(self, response, category_uids: List[str], page: int, page_size: int):
+        """
+        Map each aliased result back to its category and continue pagination per category.
+        """
+        try:
+            data = orjson.loads(response.body)
+        except orjson.JSONDecodeError:
+            self.logger.error(f"Failed to decode JSON from {response.url}")
+            data = {}
+
+        results = data.get("data") or {}
+        if "errors" in data:
+            self.logger.error(f"GraphQL Errors for batch {category_uids}: {data['errors']}")
+            if is_page_size_error(data["errors"]) and page_size > MIN_PAGE_SIZE:
+                yield from self.fetch_products_batch(category_uids, page, page_size // 2)
+                return
+
+        for i, category_uid in enumerate(category_uids):
+            products_data = results.get(f"c{i}")
+            if products_data is None:
+                # Alias failed (or the whole batch did): retry this category on its own
+                yield from self.fetch_products(category_uid, page, page_size)
+            else:
+                yield from self.parse_products_page(products_data, category_uid, page, page_size)
+
+    def parse_products(self, response, category_uid: str, page: int, page_size: int):
         """
         Parse product data and handle pagination.
         """
         try:
-            data = json.loads(response.body)
+            data = orjson.loads(response.body)
             
             if "errors" in data:
                 self.logger.error(f"GraphQL Errors for Cat {category_uid} Page {page}: {data['errors']}")
+                # Page numbers depend on the page size, so a smaller size restarts the category
+                if is_page_size_error(data["errors"]) and page_size > MIN_PAGE_SIZE:
+                    yield from self.fetch_products(category_uid, 1, page_size // 2)
                 return
 
             products_data = data.get("data", {}).get("products", {})
-            items = products_data.get("items", [])
-            page_info = products_data.get("page_info", {})
-            total_pages = page_info.get("total_pages", 1)
+            yield from self.parse_products_page(products_data, category_uid, page, page_size)
+
+        except orjson.JSONDecodeError:
+            self.logger.error(f"Failed to decode JSON from {response.url}")
+
+    def parse_products_page(self, products_data: Dict[str, Any], category_uid: str, page: int, page_size: int):
+        """
+        Yield the items of one products result and, for the first page, the remaining pages.
+        """
+        items = products_data.get("items", [])
+        page_info = products_data.get("page_info", {})
+        total_pages = page_info.get("total_pages", 1)
+
+        self.logger.info(f"Scraped {len(items)} products from Cat '{category_uid}' Page {page}/{total_pages}")
 
-            self.logger.info(f"Scraped {len(items)} products from Cat '{category_uid}' Page {page}/{total_pages}")
+        for item in items:
+            product = self.process_product_item(item)
+            if product is not None:
+                yield product
 
-            for item in items:
-                yield self.process_product_item(item)
+        # Pagination: once the first page reveals total_pages, schedule the rest concurrently
+        if page == 1:
+            for next_page in range(2, total_pages + 1):
+                yield from self.fetch_products(category_uid, next_page, page_size)
 
-            # Pagination
-            if page < total_pages:
-                next_page = page + 1
-                yield from self.fetch_products(category_uid, next_page)
+    def process_product_item(self, item: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Tag a raw GraphQL product with its source site, or return None for a SKU already emitted.
+        Nested price/image fields are flattened in bulk by ArrowPipeline.
+        """
+        return tag_new_product(item, self._seen_skus)
+
+    def fetch_product_details(self, skus: List[str]):
+        """
+        Generate GraphQL requests for the heavy fields of specific SKUs, DETAIL_BATCH_SIZE at a time.
+        """
+        for i in range(0, len(skus), DETAIL_BATCH_SIZE):
+            chunk = skus[i:i + DETAIL_BATCH_SIZE]
+            payload = {
+                "query": DETAIL_QUERY,
+                "variables": {
+                    "skus": chunk,
+                    "pageSize": len(chunk)
+                }
+            }
 
-        except json.JSONDecodeError:
+            yield scrapy.Request(
+                url=self.api_url,
+                method="POST",
+                headers=self.headers,
+                body=orjson.dumps(payload),
+                callback=self.parse_product_details,
+                cb_kwargs={"skus": chunk},
+                errback=self.handle_error,
+                dont_filter=True
+            )
+
+    def parse_product_details(self, response, skus: List[str]):
+        """
+        Parse the detail query into one record per SKU.
+        """
+        try:
+            data = orjson.loads(response.body)
+        except orjson.JSONDecodeError:
             self.logger.error(f"Failed to decode JSON from {response.url}")
+            return
 
-    def process_product_item(self, item: Dict[str, Any]) -> Dict[str, Any]:
-        """
-        Extract and format product data.
-        """
-        price_info = item.get("price_range", {}).get("maximum_price", {})
-        final_price = price_info.get("final_price", {}).get("value")
-        regular_price = price_info.get("regular_price", {}).get("value")
-        currency = price_info.get("final_price", {}).get("currency")
-        
-        # Calculate discount if present
-        discount = price_info.get("discount", {})
-        
-        return {
-            "id": item.get("id"),
-            "uid": item.get("uid"),
-            "sku": item.get("sku"),
-            "name": item.get("name"),
-            "url_key": item.get("url_key"),
-            "stock_status": item.get("stock_status"),
-            "final_price": final_price,
-            "regular_price": regular_price,
-            "currency": currency,
-            "discount_amount": discount.get("amount_off"),
-            "discount_percent": discount.get("percent_off"),
-            "image_url": item.get("small_image", {}).get("url"),
-            "description": item.get("description", {}).get("html"), # Be careful with HTML content size
-            "source_site": "electric-house"
-        }
+        if "errors" in data:
+            self.logger.error(f"GraphQL Errors for SKUs {skus}: {data['errors']}")
+            return
+
+        for item in data.get("data", {}).get("products", {}).get("items", []):
+            price_info = item.get("price_range", {}).get("maximum_price", {})
+            discount = price_info.get("discount", {})
+            yield {
+                "sku": item.get("sku"),
+                "currency": price_info.get("final_price", {}).get("currency"),
+                "discount_amount": discount.get("amount_off"),
+                "discount_percent": discount.get("percent_off"),
+                "description": item.get("description", {}).get("html"),
+                "source_site": "electric-house"
+            }
 
     def handle_error(self, failure):
         self.logger.error(f"Request failed: {failure.request.url} - {failure.value}")
@@ -0,0 +1,124 @@
+"""
+Scrapy-free crawler for the Electric House GraphQL API.
+
+Every request is a JSON POST to a single endpoint, so a plain aiohttp session with a
+pool of workers avoids Scrapy's per-request middleware stack. Output matches the spider:
+raw items are flattened and written to Parquet by ArrowPipeline.
+
+Usage: python -m scrapers.electrichouse_async [store]
+"""
+import asyncio
+import logging
+import sys
+from typing import Dict, Any
+
+import aiohttp
+import orjson
+
+from scrapers.electrichouse import (
+    CATEGORY_BODY,
+    MIN_PAGE_SIZE,
+    PAGE_SIZE,
+    PRODUCTS_QUERY,
+    ElectricHouseSpider,
+    is_page_size_error,
+    leaf_category_uids,
+    tag_new_product,
+)
+from scrapers.pipelines import ArrowPipeline
+
+logger = logging.getLogger(__name__)
+
+CONCURRENCY = 64
+
+async def post(session: aiohttp.ClientSession, body: bytes) -> Dict[str, Any]:
+    async with session.post(ElectricHouseSpider.api_url, data=body) as response:
+        return orjson.loads(await response.read())
+
+async def crawl(store: str = "en", output_path: str = "output.parquet"):
+    """
+    Fetch the category tree, then drain a queue of (category_uid, page, page_size) with
+    CONCURRENCY workers. The first page of each category enqueues the remaining pages.
+    """
+    headers = {**ElectricHouseSpider.headers, "Store": store}
+    pipeline = ArrowPipeline(output_path=output_path)
+    pipeline.open_spider()
+
+    finished = False
+    try:
+        connector = aiohttp.TCPConnector(limit=CONCURRENCY, ttl_dns_cache=300)
+        async with aiohttp.ClientSession(connector=connector, headers=headers) as session:
+            try:
+                data = await post(session, CATEGORY_BODY)
+                categories = (data.get("data") or {}).get("categoryList") or []
+            except Exception:
+                logger.exception("Failed to fetch the category tree")
+                return
+            logger.info(f"Found {len(categories)} root categories")
+
+            # Products listed under several categories are written once
+            seen_skus = set()
+            queue: asyncio.Queue = asyncio.Queue()
+            for uid in leaf_category_uids(categories):
+                queue.put_nowait((uid, 1, PAGE_SIZE))
+
+            async def worker():
+                while True:
+                    category_uid, page, page_size = await queue.get()
+                    try:
+                        body = orjson.dumps({
+                            "query": PRODUCTS_QUERY,
+                            "variables": {"uid": category_uid, "page": page, "pageSize": page_size}
+                        })
+                        data = await post(session, body)
+                        if "errors" in data:
+                            logger.error(f"GraphQL Errors for Cat {category_uid} Page {page}: {data['errors']}")
+                            # Same fallback as the spider: restart the category with a smaller page
+                            if is_page_size_error(data["errors"]) and page_size > MIN_PAGE_SIZE:
+                                queue.put_nowait((category_uid, 1, page_size // 2))
+                            continue
+
+                        products_data = (data.get("data") or {}).get("products") or {}
+                        items = products_data.get("items", [])
+                        total_pages = products_data.get("page_info", {}).get("total_pages", 1)
+                        logger.info(f"Scraped {len(items)} products from Cat '{category_uid}' Page {page}/{total_pages}")
+
+                        for item in items:
+                            product = tag_new_product(item, seen_skus)
+                            if product is not None:
+                                pipeline.process_item(product)
+
+                        if page == 1:
+                            for next_page in range(2, total_pages + 1):
+                                queue.put_nowait((category_uid, next_page, page_size))
+                    except Exception:
+                        # Any failure must not kill the worker, or queue.join() could wait forever
+                        logger.exception(f"Request failed for Cat {category_uid} Page {page}")
+                    finally:
+                        queue.task_done()
+
+            workers = [asyncio.create_task(worker()) for _ in range(CONCURRENCY)]
+            await queue.join()
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            finished = True
+    finally:
+        # Always close the writer, but only replace the previous output after a full crawl
+        pipeline.close_spider()
+        if finished:
+            pipeline.publish()
+        elif pipeline.writer is not None:
+            logger.warning(f"Crawl interrupted; keeping partial output in {pipeline.tmp_path}")
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    try:
+        import uvloop
+        uvloop.install()
+    except ImportError:
+        pass
+    asyncio.run(crawl(store=sys.argv[1] if len(sys.argv) > 1 else "en"))
+
+if __name__ == "__main__":
+    main()
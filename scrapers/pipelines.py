@@ -0,0 +1,122 @@
+import logging
+import os
+from typing import Dict, Any, List
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from scrapy import signals
+
+logger = logging.getLogger(__name__)
+
+# Shape of the raw GraphQL product items yielded by ElectricHouseSpider
+RAW_PRODUCT_SCHEMA = pa.schema([
+    ("sku", pa.string()),
+    ("name", pa.string()),
+    ("url_key", pa.string()),
+    ("stock_status", pa.string()),
+    ("price_range", pa.struct([
+        ("maximum_price", pa.struct([
+            ("final_price", pa.struct([("value", pa.float64())])),
+            ("regular_price", pa.struct([("value", pa.float64())])),
+        ])),
+    ])),
+    ("small_image", pa.struct([("url", pa.string())])),
+    ("source_site", pa.string()),
+])
+
+# Flat columns written to Parquet and read by the dashboard
+PRODUCT_SCHEMA = pa.schema([
+    ("sku", pa.string()),
+    ("name", pa.string()),
+    ("url_key", pa.string()),
+    ("stock_status", pa.string()),
+    ("final_price", pa.float64()),
+    ("regular_price", pa.float64()),
+    ("image_url", pa.string()),
+    ("source_site", pa.string()),
+])
+
+def flatten_products(table: pa.Table) -> pa.Table:
+    """
+    Pull the nested price and image fields up into flat columns in one vectorized pass.
+    """
+    price_range = table["price_range"]
+    return pa.Table.from_arrays(
+        [
+            table["sku"],
+            table["name"],
+            table["url_key"],
+            table["stock_status"],
+            pc.struct_field(price_range, ["maximum_price", "final_price", "value"]),
+            pc.struct_field(price_range, ["maximum_price", "regular_price", "value"]),
+            pc.struct_field(table["small_image"], ["url"]),
+            table["source_site"],
+        ],
+        schema=PRODUCT_SCHEMA,
+    )
+
+class ArrowPipeline:
+    """
+    Buffer scraped products and stream them to a zstd-compressed Parquet file.
+    The file is written under a temporary name and swapped in only when the crawl
+    finishes normally, so the dashboard never reads a half-written or partial file.
+    """
+    batch_size = 4096
+
+    def __init__(self, output_path: str = "output.parquet", crawler=None):
+        self.crawler = crawler
+        self.output_path = output_path
+        self.tmp_path = f"{output_path}.tmp"
+        self.batch: List[Dict[str, Any]] = []
+        self.writer = None
+        self.enabled = True
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        pipeline = cls(output_path=crawler.settings.get("ARROW_OUTPUT_PATH", "output.parquet"), crawler=crawler)
+        # spider_closed fires after close_spider and carries the close reason
+        crawler.signals.connect(pipeline.spider_closed, signal=signals.spider_closed)
+        return pipeline
+
+    def open_spider(self):
+        # Detail mode (`-a skus=...`) yields a different record shape; leave it to feed exports.
+        # Without a crawler (the aiohttp crawler) there is no detail mode.
+        spider = self.crawler.spider if self.crawler is not None else None
+        self.enabled = not getattr(spider, "detail_skus", None)
+
+    def process_item(self, item):
+        if self.enabled:
+            self.batch.append(item)
+            if len(self.batch) >= self.batch_size:
+                self._flush()
+        return item
+
+    def close_spider(self):
+        if not self.enabled:
+            return
+        self._flush()
+        if self.writer is not None:
+            self.writer.close()
+
+    def spider_closed(self, spider, reason):
+        if reason == "finished":
+            self.publish()
+        elif self.enabled and self.writer is not None:
+            logger.warning(f"Crawl closed ({reason}); keeping partial output in {self.tmp_path}")
+
+    def publish(self):
+        """
+        Swap the completed file in place of the previous output. Call only after a full crawl.
+        """
+        if self.enabled and self.writer is not None:
+            os.replace(self.tmp_path, self.output_path)
+
+    def _flush(self):
+        if not self.batch:
+            return
+        table = flatten_products(pa.Table.from_pylist(self.batch, schema=RAW_PRODUCT_SCHEMA))
+        if self.writer is None:
+            self.writer = pq.ParquetWriter(self.tmp_path, table.schema, compression="zstd")
+        self.writer.write_table(table)
+        self.batch.clear()